@@ -4,9 +4,72 @@ Uses Claude AI to analyze WhatsApp conversations
 """
 
 import os
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from anthropic import Anthropic
-import json
+import orjson
+
+
+# Static instruction block, identical for every analysis call. Keeping it in
+# a system block marked with cache_control lets the API cache the processed
+# prefix, so repeated calls only pay for the conversation itself.
+ANALYSIS_INSTRUCTIONS = """You are analyzing a WhatsApp conversation.
+
+Please analyze this conversation and provide:
+
+1. **Summary**: A concise 2-3 paragraph summary of the conversation covering main topics and key points
+2. **Sentiment Analysis**: Overall sentiment (positive/negative/neutral/mixed) with a confidence score and brief explanation
+3. **Individual Sentiments**: Sentiment for each participant
+4. **Key Topics**: Main topics discussed (as a list)
+5. **Actionables**: Extract any action items, tasks, commitments, or things that need to be done. Include:
+   - What needs to be done
+   - Who is responsible (if mentioned)
+   - Deadline (if mentioned)
+   - Priority indicators (if any)
+   - Context
+
+Return your analysis in the following JSON format:
+
+{
+  "summary": "Your detailed summary here...",
+  "overall_sentiment": {
+    "sentiment": "positive|negative|neutral|mixed",
+    "confidence": 0.85,
+    "explanation": "Brief explanation of the sentiment"
+  },
+  "participant_sentiments": [
+    {
+      "participant": "Name",
+      "sentiment": "positive|negative|neutral",
+      "explanation": "Brief explanation"
+    }
+  ],
+  "key_topics": [
+    "Topic 1",
+    "Topic 2"
+  ],
+  "actionables": [
+    {
+      "action": "What needs to be done",
+      "assignee": "Who (or 'Not specified')",
+      "deadline": "When (or 'Not specified')",
+      "priority": "high|medium|low|not specified",
+      "context": "Brief context from the conversation",
+      "mentioned_at": "Approximate timestamp or 'recent' for latest"
+    }
+  ],
+  "conversation_insights": {
+    "tone": "formal|informal|casual|professional",
+    "engagement_level": "high|medium|low",
+    "key_points": ["Point 1", "Point 2"]
+  }
+}
+
+Provide your analysis in valid JSON format only, no additional text."""
+
+QUICK_SUMMARY_INSTRUCTIONS = (
+    "Provide a brief 2-3 sentence summary of the WhatsApp conversation "
+    "the user sends. Be concise and focus on the main points."
+)
 
 
 class WhatsAppAIAnalyzer:
@@ -23,7 +86,9 @@ class WhatsAppAIAnalyzer:
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY is required")
 
-        self.client = Anthropic(api_key=self.api_key)
+        # Retries are cheap once the connection is warm; the client is
+        # long-lived (see app.get_analyzer) so it keeps pooled connections
+        self.client = Anthropic(api_key=self.api_key, max_retries=3)
 
     def analyze_conversation(self, chat_text: str, participants: List[str]) -> Dict:
         """
@@ -37,7 +102,7 @@ class WhatsAppAIAnalyzer:
             Dictionary containing analysis results
         """
         # Prepare the analysis prompt
-        prompt = self._create_analysis_prompt(chat_text, participants)
+        system_blocks, user_content = self._create_analysis_prompt(chat_text, participants)
 
         try:
             # Call Claude API
@@ -45,10 +110,11 @@ class WhatsAppAIAnalyzer:
                 model="claude-sonnet-4-20250514",
                 max_tokens=4000,
                 temperature=0.3,  # Lower temperature for more consistent analysis
+                system=system_blocks,
                 messages=[
                     {
                         "role": "user",
-                        "content": prompt
+                        "content": user_content
                     }
                 ]
             )
@@ -70,72 +136,30 @@ class WhatsAppAIAnalyzer:
                 'error': str(e)
             }
 
-    def _create_analysis_prompt(self, chat_text: str, participants: List[str]) -> str:
-        """Create the analysis prompt for Claude"""
+    def _create_analysis_prompt(self, chat_text: str, participants: List[str]) -> Tuple[List[Dict], str]:
+        """Create the analysis prompt for Claude.
 
+        Returns the cacheable system blocks and the per-call user content:
+        only the user content varies between conversations, so the API can
+        reuse the cached instruction prefix.
+        """
         participants_str = ", ".join(participants)
 
-        prompt = f"""You are analyzing a WhatsApp conversation between {participants_str}.
-
-Please analyze this conversation and provide:
-
-1. **Summary**: A concise 2-3 paragraph summary of the conversation covering main topics and key points
-2. **Sentiment Analysis**: Overall sentiment (positive/negative/neutral/mixed) with a confidence score and brief explanation
-3. **Individual Sentiments**: Sentiment for each participant
-4. **Key Topics**: Main topics discussed (as a list)
-5. **Actionables**: Extract any action items, tasks, commitments, or things that need to be done. Include:
-   - What needs to be done
-   - Who is responsible (if mentioned)
-   - Deadline (if mentioned)
-   - Priority indicators (if any)
-   - Context
-
-Return your analysis in the following JSON format:
-
-{{
-  "summary": "Your detailed summary here...",
-  "overall_sentiment": {{
-    "sentiment": "positive|negative|neutral|mixed",
-    "confidence": 0.85,
-    "explanation": "Brief explanation of the sentiment"
-  }},
-  "participant_sentiments": [
-    {{
-      "participant": "Name",
-      "sentiment": "positive|negative|neutral",
-      "explanation": "Brief explanation"
-    }}
-  ],
-  "key_topics": [
-    "Topic 1",
-    "Topic 2"
-  ],
-  "actionables": [
-    {{
-      "action": "What needs to be done",
-      "assignee": "Who (or 'Not specified')",
-      "deadline": "When (or 'Not specified')",
-      "priority": "high|medium|low|not specified",
-      "context": "Brief context from the conversation",
-      "mentioned_at": "Approximate timestamp or 'recent' for latest"
-    }}
-  ],
-  "conversation_insights": {{
-    "tone": "formal|informal|casual|professional",
-    "engagement_level": "high|medium|low",
-    "key_points": ["Point 1", "Point 2"]
-  }}
-}}
+        system_blocks = [
+            {
+                "type": "text",
+                "text": ANALYSIS_INSTRUCTIONS,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
 
-Here is the WhatsApp conversation to analyze:
+        user_content = f"""This conversation is between {participants_str}.
 
 ---START CONVERSATION---
 {chat_text}
----END CONVERSATION---
+---END CONVERSATION---"""
 
-Provide your analysis in valid JSON format only, no additional text."""
-
-        return prompt
+        return system_blocks, user_content
 
     def _parse_analysis_response(self, response_text: str) -> Dict:
         """Parse Claude's response and extract JSON"""
@@ -143,20 +167,32 @@ Provide your analysis in valid JSON format only, no additional text."""
         # Try to find JSON in the response
         try:
             # First, try to parse the entire response as JSON
-            return json.loads(response_text)
-        except json.JSONDecodeError:
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            # Cheap linear scan next: slice from the first '{' to the last
+            # '}' and try that. Avoids running DOTALL regexes with lazy
+            # quantifiers over multi-KB responses in the common case where
+            # the model just wrapped the JSON in a little prose
+            start = response_text.find('{')
+            end = response_text.rfind('}')
+            if 0 <= start < end:
+                try:
+                    return orjson.loads(response_text[start:end + 1])
+                except orjson.JSONDecodeError:
+                    pass
+
             # If that fails, try to extract JSON from markdown code blocks
             import re
 
             # Look for JSON in code blocks
             json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
             if json_match:
-                return json.loads(json_match.group(1))
+                return orjson.loads(json_match.group(1))
 
             # Look for JSON without code blocks
             json_match = re.search(r'(\{.*\})', response_text, re.DOTALL)
             if json_match:
-                return json.loads(json_match.group(1))
+                return orjson.loads(json_match.group(1))
 
             # If all parsing fails, return a structured error
             return {
@@ -186,20 +222,21 @@ Provide your analysis in valid JSON format only, no additional text."""
         Returns:
             Summary string
         """
-        prompt = f"""Provide a brief 2-3 sentence summary of this WhatsApp conversation:
-
-{chat_text[:3000]}
-
-Be concise and focus on the main points."""
-
         try:
             message = self.client.messages.create(
                 model="claude-sonnet-4-20250514",
                 max_tokens=300,
+                system=[
+                    {
+                        "type": "text",
+                        "text": QUICK_SUMMARY_INSTRUCTIONS,
+                        "cache_control": {"type": "ephemeral"}
+                    }
+                ],
                 messages=[
                     {
                         "role": "user",
-                        "content": prompt
+                        "content": chat_text[:3000]
                     }
                 ]
             )
@@ -4,25 +4,57 @@ Main application file
 """
 
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import secure_filename
+import io
 import os
+import orjson
 from dotenv import load_dotenv
 import traceback
 
-from whatsapp_parser import parse_whatsapp_chat
+from whatsapp_parser import parse_whatsapp_chat, dedupe_chat_text
 from ai_analyzer import WhatsAppAIAnalyzer
 
 # Load environment variables
 load_dotenv()
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    Serializing the /quick-parse response (potentially 100K message dicts)
+    with the stdlib encoder iterates every key at Python level; orjson does
+    it in C, several times faster.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'txt'}
 
+# Shared AI analyzer: constructing one per request would open a fresh HTTPS
+# connection (TCP + TLS handshake) for every call, while a single client
+# reuses pooled keep-alive connections
+_analyzer = None
+
+
+def get_analyzer():
+    """Return the shared WhatsAppAIAnalyzer, creating it on first use"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = WhatsAppAIAnalyzer()
+    return _analyzer
+
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -71,25 +103,13 @@ def analyze():
                 'error': 'Invalid file type. Please upload a .txt file'
             }), 400
 
-        # Read file content
-        try:
-            # Try UTF-8 first
-            content = file.read().decode('utf-8')
-        except UnicodeDecodeError:
-            # Fallback to latin-1 if UTF-8 fails
-            file.seek(0)
-            content = file.read().decode('latin-1')
-
-        # Validate content
-        if not content or len(content.strip()) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'File is empty'
-            }), 400
+        # Parse WhatsApp chat straight from the upload stream: decoding
+        # incrementally avoids materializing the whole file as one string.
+        # An empty or non-chat file surfaces as message_count == 0 below.
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8', errors='replace')
 
-        # Parse WhatsApp chat
         try:
-            parsed_data = parse_whatsapp_chat(content)
+            parsed_data = parse_whatsapp_chat(stream)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -103,18 +123,19 @@ def analyze():
                 'error': 'No valid messages found in the file. Please ensure this is a WhatsApp chat export.'
             }), 400
 
-        # Initialize AI analyzer
+        # Get the shared AI analyzer
         try:
-            analyzer = WhatsAppAIAnalyzer()
+            analyzer = get_analyzer()
         except ValueError as e:
             return jsonify({
                 'success': False,
                 'error': 'AI analyzer not configured. Please set ANTHROPIC_API_KEY in .env file'
             }), 500
 
-        # Run AI analysis
+        # Run AI analysis; collapse repeated blocks first so duplicated
+        # content (forwards, quoted replies) isn't tokenized twice
         analysis_result = analyzer.analyze_conversation(
-            chat_text=parsed_data['text'],
+            chat_text=dedupe_chat_text(parsed_data['text']),
             participants=parsed_data['participants']
         )
 
@@ -175,14 +196,14 @@ def quick_parse():
                 'error': 'Invalid file type. Please upload a .txt file'
             }), 400
 
-        # Read and parse
-        try:
-            content = file.read().decode('utf-8')
-        except UnicodeDecodeError:
-            file.seek(0)
-            content = file.read().decode('latin-1')
+        # Read and parse straight from the upload stream
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8', errors='replace')
+        parsed_data = parse_whatsapp_chat(stream)
 
-        parsed_data = parse_whatsapp_chat(content)
+        # This endpoint returns the full message list, so force the lazy
+        # 'messages' entry now: the JSON encoder iterates the dict's
+        # storage directly and would miss an unmaterialized key
+        parsed_data['messages']
 
         return jsonify({
             'success': True,
@@ -3,24 +3,42 @@ WhatsApp Chat Parser Module
 Parses WhatsApp exported chat files and extracts structured data
 """
 
+import io
 import re
+import zlib
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Union
 from dateutil import parser as date_parser
 
+try:
+    # Optional accelerator: finds all system-message markers in one O(N)
+    # automaton pass instead of one substring scan per marker
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 
 class WhatsAppMessage:
     """Represents a single WhatsApp message"""
 
-    def __init__(self, timestamp: datetime, sender: str, content: str, is_system: bool = False):
+    # Fixed attribute set: dropping the per-instance __dict__ saves a few
+    # hundred bytes per message, which adds up over 100K-message chats
+    __slots__ = ('timestamp', 'sender', 'content', 'is_system', '_ts_str', '_iso')
+
+    def __init__(self, timestamp: datetime, sender: str, content: str, is_system: bool = False,
+                 ts_str: Optional[str] = None, iso: Optional[str] = None):
         self.timestamp = timestamp
         self.sender = sender
         self.content = content
         self.is_system = is_system
+        # Display and ISO timestamps, computed once here rather than per
+        # to_text()/to_dict() call
+        self._ts_str = ts_str or timestamp.strftime('%m/%d/%y, %I:%M %p')
+        self._iso = iso or timestamp.isoformat()
 
     def to_dict(self) -> Dict:
         return {
-            'timestamp': self.timestamp.isoformat(),
+            'timestamp': self._iso,
             'sender': self.sender,
             'content': self.content,
             'is_system': self.is_system
@@ -30,184 +48,447 @@ class WhatsAppMessage:
 class WhatsAppChatParser:
     """Parses WhatsApp chat export files"""
 
-    # Different WhatsApp export formats
-    PATTERNS = [
-        # Format: 2024/05/06, 11:07 - John: Message (YYYY/MM/DD - common in many regions)
-        r'(\d{4}/\d{1,2}/\d{1,2},\s+\d{1,2}:\d{2}(?::\d{2})?)\s*[-–]\s*([^:]+?):\s*(.*)',
-        # Format: 1/15/25, 10:30 AM - John: Message (M/D/YY with AM/PM)
-        r'(\d{1,2}/\d{1,2}/\d{2,4},\s+\d{1,2}:\d{2}(?:\s*[AP]M)?)\s*[-–]\s*([^:]+?):\s*(.*)',
-        # Format: [1/15/25, 10:30:45 AM] John: Message (bracketed format)
-        r'\[(\d{1,2}/\d{1,2}/\d{2,4},\s+\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AP]M)?)\]\s*([^:]+?):\s*(.*)',
-        # Format: 15/01/25, 10:30 - John: Message (DD/MM/YY or M/D/YY 24-hour)
-        r'(\d{1,2}/\d{1,2}/\d{2,4},\s+\d{1,2}:\d{2}(?::\d{2})?)\s*[-–]\s*([^:]+?):\s*(.*)',
-        # Format: 2025-01-15, 10:30 - John: Message (ISO-like with hyphens)
-        r'(\d{4}-\d{1,2}-\d{1,2},\s+\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AP]M)?)\s*[-–]\s*([^:]+?):\s*(.*)',
-    ]
-
-    # System message patterns (notifications, not actual messages)
-    SYSTEM_PATTERNS = [
-        r'Messages and calls are end-to-end encrypted',
-        r'changed the subject',
-        r'changed this group\'s icon',
-        r'added',
-        r'left',
-        r'removed',
-        r'You created group',
-        r'created group',
-        r'changed their phone number',
-        r'security code changed',
+    # All WhatsApp export formats share one shape: optional '[', a date
+    # (YYYY/MM/DD, M/D/YY, DD/MM/YY or YYYY-MM-DD), a time with optional
+    # seconds and AM/PM, optional ']' and dash, then 'Sender: Message'.
+    # A single alternation lets the regex engine's fast-map prune in one
+    # pass instead of trying several patterns per line.
+    # Whitespace classes deliberately exclude '\n' so the MULTILINE variant
+    # can't run a match across line boundaries.
+    MESSAGE_PATTERN = (
+        r'^[^\S\n]*\[?'
+        r'(?P<ts>(?:\d{4}[/-]\d{1,2}[/-]\d{1,2}|\d{1,2}/\d{1,2}/\d{2,4}),'
+        r'[^\S\n]+\d{1,2}:\d{2}(?::\d{2})?(?:[^\S\n]*[AP]M)?)'
+        r'\]?[^\S\n]*[-–]?[^\S\n]*'
+        r'(?P<sender>[^:\n]+?):[^\S\n]*'
+        r'(?P<body>.*)$'
+    )
+
+    # System message markers (notifications, not actual messages). These are
+    # all plain substrings, so a case-folded `in` check is much cheaper than
+    # a case-insensitive regex search per message.
+    SYSTEM_LITERALS = (
+        'messages and calls are end-to-end encrypted',
+        'changed the subject',
+        "changed this group's icon",
+        'added',
+        'left',
+        'removed',
+        'you created group',
+        'created group',
+        'changed their phone number',
+        'security code changed',
+    )
+
+    # Built once at import time when pyahocorasick is available; None
+    # otherwise, in which case _is_system_message falls back to the
+    # per-literal substring checks
+    if ahocorasick is not None:
+        _SYSTEM_AUTOMATON = ahocorasick.Automaton()
+        for _literal in SYSTEM_LITERALS:
+            _SYSTEM_AUTOMATON.add_word(_literal, _literal)
+        _SYSTEM_AUTOMATON.make_automaton()
+        del _literal
+    else:
+        _SYSTEM_AUTOMATON = None
+
+    # Compiled once at import time so parse() doesn't pay regex-cache lookups
+    # and pattern dispatch on every line of a large export. The MULTILINE
+    # variant drives the whole-buffer scan in _parse_buffer.
+    _MESSAGE_RE = re.compile(MESSAGE_PATTERN)
+    _MESSAGE_RE_M = re.compile(MESSAGE_PATTERN, re.MULTILINE)
+
+    # Fast timestamp extractor covering every shape MESSAGE_PATTERN accepts:
+    # year-first dates (2024/05/06 or 2025-01-15) or day/month-style dates
+    # (1/15/25, 15/01/25), then HH:MM with optional seconds and AM/PM.
+    _TS_RE = re.compile(
+        r'(?:(\d{4})[/-](\d{1,2})[/-](\d{1,2})|(\d{1,2})/(\d{1,2})/(\d{2,4})),'
+        r'\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([AP]M)?'
+    )
+
+    # Explicit formats for the rare lines the extractor can't handle
+    _FALLBACK_FORMATS = [
+        '%Y/%m/%d, %H:%M',
+        '%Y/%m/%d, %H:%M:%S',
+        '%m/%d/%y, %I:%M %p',
+        '%m/%d/%Y, %I:%M %p',
+        '%d/%m/%y, %H:%M',
+        '%d/%m/%Y, %H:%M',
+        '%Y-%m-%d, %H:%M',
+        '%m/%d/%y, %H:%M:%S',
+        '%d/%m/%y, %H:%M:%S',
     ]
 
     def __init__(self):
-        self.messages: List[WhatsAppMessage] = []
-
-    def parse(self, content: str) -> List[WhatsAppMessage]:
+        # Columnar (structure-of-arrays) storage: the stats helpers each
+        # touch one field for every message, so keeping each field in its
+        # own dense list avoids chasing a heap object per access
+        self.timestamps: List[datetime] = []
+        self.senders: List[str] = []
+        self.contents: List[str] = []
+        self.is_system = bytearray()
+        self._ts_strs: List[str] = []
+        self._isos: List[str] = []
+        self._messages: Optional[List[WhatsAppMessage]] = None
+        self._summary: Optional[tuple] = None
+        self._last_fmt = 0
+        self._ts_cache: Dict[str, tuple] = {}
+
+    def parse(self, content: Union[str, Iterable[str]]) -> List[WhatsAppMessage]:
         """
         Parse WhatsApp chat content and return list of messages
 
         Args:
-            content: Raw text content from WhatsApp export
+            content: Raw text content from WhatsApp export, either as a
+                single string or as an iterable of lines (e.g. an open
+                text stream, which avoids materializing the whole file)
 
         Returns:
             List of WhatsAppMessage objects
         """
-        self.messages = []
-        lines = content.split('\n')
+        self._scan(content)
+        return self.messages
 
-        current_message = None
+    def _scan(self, content: Union[str, Iterable[str]]) -> None:
+        """Reset the columns and parse content into them"""
+        self.timestamps = []
+        self.senders = []
+        self.contents = []
+        self.is_system = bytearray()
+        self._ts_strs = []
+        self._isos = []
+        self._messages = None
+        self._summary = None
+
+        if isinstance(content, str):
+            # Fast path: one regex sweep over the whole buffer
+            self._parse_buffer(content)
+        else:
+            # Fallback: anything iterable that yields lines
+            self._parse_lines(content)
+
+    def _parse_buffer(self, content: str) -> None:
+        """Scan the full buffer with a single multiline regex pass.
+
+        One finditer sweep replaces the per-line match calls; the text
+        between consecutive matches holds the continuation lines of the
+        preceding message.
+        """
+        ts_entry = self._ts_entry
+        is_system_message = self._is_system_message
+        commit = self._commit
+        extend_fragments = self._extend_fragments
+
+        # In-flight message: (ts_entry, sender, fragments, is_system)
+        pending = None
+        # Offset where the pending message's continuation text begins
+        tail_start = 0
+
+        for match in self._MESSAGE_RE_M.finditer(content):
+            if pending:
+                extend_fragments(pending[2], content, tail_start, match.start())
+                commit(*pending)
+
+            timestamp_str, sender, body = match.group('ts', 'sender', 'body')
+
+            try:
+                entry = ts_entry(timestamp_str)
+            except:
+                # If timestamp parsing fails, skip this line
+                pending = None
+                continue
+
+            pending = (entry, sender.strip(), [body.strip()],
+                       is_system_message(body))
+            tail_start = match.end()
+
+        if pending:
+            extend_fragments(pending[2], content, tail_start, len(content))
+            commit(*pending)
+
+    @staticmethod
+    def _extend_fragments(fragments: List[str], content: str, start: int, end: int) -> None:
+        """Append the stripped, non-empty lines of content[start:end]"""
+        if start >= end:
+            return
+        for raw in content[start:end].split('\n'):
+            raw = raw.strip()
+            if raw:
+                fragments.append(raw)
+
+    def _parse_lines(self, lines) -> None:
+        """Parse from an iterable of lines (the non-buffer fallback path)"""
+        # In-flight message: (ts_entry, sender, fragments, is_system)
+        pending = None
+
+        # The loop body is interpreter-bound once the regexes are compiled,
+        # so hoist the per-line attribute lookups into locals
+        message_match = self._MESSAGE_RE.match
+        ts_entry = self._ts_entry
+        is_system_message = self._is_system_message
+        commit = self._commit
 
         for line in lines:
             line = line.strip()
             if not line:
                 continue
 
-            # Try to match message patterns
-            matched = False
-            for pattern in self.PATTERNS:
-                match = re.match(pattern, line)
-                if match:
-                    # If we have a previous message, save it
-                    if current_message:
-                        self.messages.append(current_message)
-
-                    timestamp_str, sender, content = match.groups()
-
-                    # Parse timestamp
-                    try:
-                        timestamp = self._parse_timestamp(timestamp_str)
-                    except:
-                        # If timestamp parsing fails, skip this line
-                        continue
-
-                    # Check if it's a system message
-                    is_system = self._is_system_message(content)
-
-                    current_message = WhatsAppMessage(
-                        timestamp=timestamp,
-                        sender=sender.strip(),
-                        content=content.strip(),
-                        is_system=is_system
-                    )
-                    matched = True
-                    break
-
-            # If line doesn't match a new message, it's a continuation of previous message
-            if not matched and current_message:
-                current_message.content += '\n' + line
+            # Cheap pre-check: a new message always starts with a digit or
+            # '[', so continuation lines (the common case in long chats)
+            # are rejected with one comparison instead of a regex call
+            first_char = line[0]
+            if not (first_char.isdigit() or first_char == '['):
+                if pending:
+                    pending[2].append(line)
+                continue
+
+            # Try to match a new message
+            match = message_match(line)
+            if match:
+                # If we have a previous message, save it
+                if pending:
+                    commit(*pending)
 
-        # Don't forget the last message
-        if current_message:
-            self.messages.append(current_message)
+                timestamp_str, sender, content = match.group('ts', 'sender', 'body')
 
-        return self.messages
+                # Parse timestamp
+                try:
+                    entry = ts_entry(timestamp_str)
+                except:
+                    # If timestamp parsing fails, skip this line
+                    pending = None
+                    continue
+
+                # Check if it's a system message
+                is_system = is_system_message(content)
+
+                pending = (entry, sender.strip(), [content.strip()], is_system)
+            elif pending:
+                # Line doesn't start a new message: continuation of the
+                # previous one. Collect fragments and join once on commit
+                # instead of paying O(N^2) string concatenation
+                pending[2].append(line)
+
+        # Don't forget the last message
+        if pending:
+            commit(*pending)
+
+    def _commit(self, ts_entry: tuple, sender: str, fragments: List[str],
+                is_system: bool) -> None:
+        """Append a finished message to the column arrays"""
+        timestamp, iso, ts_str = ts_entry
+        self.timestamps.append(timestamp)
+        self._isos.append(iso)
+        self._ts_strs.append(ts_str)
+        self.senders.append(sender)
+        self.contents.append(fragments[0] if len(fragments) == 1 else '\n'.join(fragments))
+        self.is_system.append(1 if is_system else 0)
+
+    @property
+    def messages(self) -> List[WhatsAppMessage]:
+        """Messages as objects, built lazily from the column arrays.
+
+        Kept for API compatibility; the stats helpers below work on the
+        columns directly and never materialize these.
+        """
+        if self._messages is None:
+            self._messages = [
+                WhatsAppMessage(ts, sender, content, bool(sys_flag),
+                                ts_str=ts_str, iso=iso)
+                for ts, sender, content, sys_flag, ts_str, iso in zip(
+                    self.timestamps, self.senders, self.contents,
+                    self.is_system, self._ts_strs, self._isos
+                )
+            ]
+        return self._messages
 
     def _parse_timestamp(self, timestamp_str: str) -> datetime:
         """Parse timestamp string to datetime object"""
-        # Clean up the timestamp string
+        return self._ts_entry(timestamp_str)[0]
+
+    def _ts_entry(self, timestamp_str: str) -> tuple:
+        """Get (datetime, ISO string, display string) for a raw timestamp.
+
+        Consecutive lines repeat the same minute-stamp thousands of times
+        in bulk exports, so cache by the raw string; the derived strings
+        are then formatted once per distinct stamp instead of per message.
+        """
         timestamp_str = timestamp_str.strip()
+        entry = self._ts_cache.get(timestamp_str)
+        if entry is None:
+            timestamp = self._parse_timestamp_uncached(timestamp_str)
+            entry = self._ts_cache[timestamp_str] = (
+                timestamp,
+                timestamp.isoformat(),
+                timestamp.strftime('%m/%d/%y, %I:%M %p')
+            )
+        return entry
+
+    def _parse_timestamp_uncached(self, timestamp_str: str) -> datetime:
+        """Parse a timestamp string that isn't in the cache yet"""
+        # Fast path: extract the fields directly and build the datetime.
+        # This avoids dateutil's fuzzy parser (~50-200 µs/call) on every line.
+        match = self._TS_RE.match(timestamp_str)
+        if match:
+            groups = match.groups()
+            if groups[0]:
+                # Year-first: 2024/05/06 or 2025-01-15
+                year, month, day = int(groups[0]), int(groups[1]), int(groups[2])
+            else:
+                first, second, year = int(groups[3]), int(groups[4]), int(groups[5])
+                if year < 100:
+                    year += 2000
+                # Month-first unless the first field can't be a month
+                if first > 12:
+                    day, month = first, second
+                else:
+                    month, day = first, second
+
+            hour, minute = int(groups[6]), int(groups[7])
+            second_field = int(groups[8]) if groups[8] else 0
+            meridiem = groups[9]
+            if meridiem == 'PM' and hour != 12:
+                hour += 12
+            elif meridiem == 'AM' and hour == 12:
+                hour = 0
+
+            try:
+                return datetime(year, month, day, hour, minute, second_field)
+            except ValueError:
+                # Out-of-range fields (e.g. 25/25/25): fall through to slow path
+                pass
+
+        # Slow path: try explicit formats, starting with the one that worked
+        # last time, since odd lines in an export usually share a format
+        formats = self._FALLBACK_FORMATS
+        order = [self._last_fmt] + [i for i in range(len(formats)) if i != self._last_fmt]
+        for i in order:
+            try:
+                result = datetime.strptime(timestamp_str, formats[i])
+                self._last_fmt = i
+                return result
+            except:
+                continue
 
-        # Try fuzzy parsing which handles various formats
+        # Last resort: fuzzy parsing handles anything else
         try:
             return date_parser.parse(timestamp_str, fuzzy=True)
         except:
-            # Fallback: try common formats explicitly
-            formats = [
-                '%Y/%m/%d, %H:%M',
-                '%Y/%m/%d, %H:%M:%S',
-                '%m/%d/%y, %I:%M %p',
-                '%m/%d/%Y, %I:%M %p',
-                '%d/%m/%y, %H:%M',
-                '%d/%m/%Y, %H:%M',
-                '%Y-%m-%d, %H:%M',
-                '%m/%d/%y, %H:%M:%S',
-                '%d/%m/%y, %H:%M:%S',
-            ]
-
-            for fmt in formats:
-                try:
-                    return datetime.strptime(timestamp_str, fmt)
-                except:
-                    continue
-
             raise ValueError(f"Could not parse timestamp: {timestamp_str}")
 
     def _is_system_message(self, content: str) -> bool:
         """Check if message is a system notification"""
-        for pattern in self.SYSTEM_PATTERNS:
-            if re.search(pattern, content, re.IGNORECASE):
-                return True
-        return False
+        lowered = content.lower()
+        if self._SYSTEM_AUTOMATON is not None:
+            return next(self._SYSTEM_AUTOMATON.iter(lowered), None) is not None
+        return any(literal in lowered for literal in self.SYSTEM_LITERALS)
+
+    def _summarize(self) -> tuple:
+        """Compute participants, message count and date range in one pass.
+
+        The three public helpers below all scan every message; fusing them
+        means the columns are walked once, and the result is cached until
+        the next parse().
+        """
+        if self._summary is None:
+            participants = set()
+            count = 0
+            for sender, sys_flag in zip(self.senders, self.is_system):
+                if not sys_flag:
+                    participants.add(sender)
+                    count += 1
+            if self.timestamps:
+                start, end = min(self.timestamps), max(self.timestamps)
+            else:
+                start = end = None
+            self._summary = (sorted(participants), count, start, end)
+        return self._summary
 
     def get_participants(self) -> List[str]:
         """Get list of unique participants (excluding system messages)"""
-        participants = set()
-        for msg in self.messages:
-            if not msg.is_system:
-                participants.add(msg.sender)
-        return sorted(list(participants))
+        return self._summarize()[0]
 
     def get_message_count(self) -> int:
         """Get total number of messages (excluding system messages)"""
-        return len([msg for msg in self.messages if not msg.is_system])
+        return self._summarize()[1]
 
     def get_date_range(self) -> tuple:
         """Get the date range of the conversation"""
-        if not self.messages:
-            return None, None
-
-        timestamps = [msg.timestamp for msg in self.messages]
-        return min(timestamps), max(timestamps)
+        return self._summarize()[2:4]
 
     def to_text(self, include_system: bool = False) -> str:
         """Convert messages back to readable text format"""
-        lines = []
-        for msg in self.messages:
-            if msg.is_system and not include_system:
+        # Write into one buffer instead of building a temporary f-string
+        # per message and joining at the end
+        buf = io.StringIO()
+        write = buf.write
+        first = True
+        for ts_str, sender, content, sys_flag in zip(
+                self._ts_strs, self.senders, self.contents, self.is_system):
+            if sys_flag and not include_system:
                 continue
 
-            timestamp_str = msg.timestamp.strftime('%m/%d/%y, %I:%M %p')
-            lines.append(f"{timestamp_str} - {msg.sender}: {msg.content}")
+            if first:
+                first = False
+            else:
+                write('\n')
+            write(ts_str)
+            write(' - ')
+            write(sender)
+            write(': ')
+            write(content)
 
-        return '\n'.join(lines)
+        return buf.getvalue()
 
 
-def parse_whatsapp_chat(file_content: str) -> Dict:
+class ParsedChat(dict):
+    """Result mapping returned by parse_whatsapp_chat.
+
+    Behaves like a regular dict, except the 'messages' list (one dict per
+    message) is only built the first time it is accessed. Callers that only
+    need the metadata and text never pay for N dict allocations.
+    """
+
+    def __init__(self, parser: WhatsAppChatParser, base: Dict):
+        super().__init__(base)
+        self._parser = parser
+
+    def __getitem__(self, key):
+        if key == 'messages' and 'messages' not in self:
+            parser = self._parser
+            self['messages'] = [
+                {
+                    'timestamp': iso,
+                    'sender': sender,
+                    'content': content,
+                    'is_system': bool(sys_flag)
+                }
+                for iso, sender, content, sys_flag in zip(
+                    parser._isos, parser.senders,
+                    parser.contents, parser.is_system
+                )
+            ]
+        return dict.__getitem__(self, key)
+
+
+def parse_whatsapp_chat(file_content: Union[str, Iterable[str]]) -> Dict:
     """
     Convenience function to parse WhatsApp chat and return structured data
 
     Args:
-        file_content: Raw text content from WhatsApp export
+        file_content: Raw text content from WhatsApp export, as a single
+            string or an iterable of lines (e.g. an open text stream)
 
     Returns:
-        Dictionary with parsed data and metadata
+        Dictionary with parsed data and metadata; the 'messages' entry is
+        materialized lazily on first access
     """
     parser = WhatsAppChatParser()
-    messages = parser.parse(file_content)
+    parser._scan(file_content)
 
     start_date, end_date = parser.get_date_range()
 
-    return {
-        'messages': [msg.to_dict() for msg in messages],
+    return ParsedChat(parser, {
         'participants': parser.get_participants(),
         'message_count': parser.get_message_count(),
         'date_range': {
@@ -215,4 +496,52 @@ def parse_whatsapp_chat(file_content: str) -> Dict:
             'end': end_date.isoformat() if end_date else None
         },
         'text': parser.to_text()
-    }
+    })
+
+
+def dedupe_chat_text(text: str, boundary_mod: int = 32, max_block_lines: int = 64) -> str:
+    """
+    Collapse repeated blocks of chat text before sending it for AI analysis
+
+    Real exports often contain verbatim repeats: forwarded messages, quoted
+    replies, runs of '<Media omitted>'. Lines are grouped into content-defined
+    blocks (a block ends when a line's checksum hits a boundary, or at
+    max_block_lines), and any block seen before is replaced with a short
+    marker. Token count shrinks roughly in proportion to the duplication;
+    unique chats pass through unchanged.
+
+    Args:
+        text: Formatted chat text (one message per line)
+        boundary_mod: Average block length; a line ends a block when its
+            CRC32 is divisible by this
+        max_block_lines: Hard cap on block length
+
+    Returns:
+        Text with repeated blocks replaced by '[[repeat of block #N]]'
+    """
+    seen: Dict[str, int] = {}
+    out: List[str] = []
+    block: List[str] = []
+
+    def flush():
+        if not block:
+            return
+        chunk = '\n'.join(block)
+        block_id = seen.get(chunk)
+        if block_id is None:
+            seen[chunk] = len(seen) + 1
+            out.append(chunk)
+        else:
+            out.append(f'[[repeat of block #{block_id}]]')
+        block.clear()
+
+    for line in text.split('\n'):
+        block.append(line)
+        # Content-defined boundary: split where the line checksum lands on
+        # the modulus so identical regions chunk identically regardless of
+        # where they appear in the file
+        if len(block) >= max_block_lines or zlib.crc32(line.encode('utf-8')) % boundary_mod == 0:
+            flush()
+    flush()
+
+    return '\n'.join(out)